@@ -0,0 +1,329 @@
+'''Fetch the ion images behind a dataset's annotations into an on-disk cache of memory-mapped NumPy arrays and render thumbnail grids of them.'''
+
+import os
+import re
+import math
+import threading
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+from .metaspace_fetch import metaspaceFetch
+
+class ionImageCache():
+
+    def __init__(self, cachePathName: str = "./image_cache/", max_Bytes: int = 2**30,
+                 hotspot_Clipping: bool = True, scale_Intensity=True):
+        '''
+        Setup ionImageCache class, creates the cache directory if it does not exist
+
+        Parameters
+        ----------
+        cachePathName : str, optional
+            The path name where cached ion images are located.
+            The default is "./image_cache/".
+        max_Bytes : int, optional
+            The cache size on disk. The least recently used images are
+            removed when it is exceeded. The default is 2**30 (1 GiB).
+        hotspot_Clipping : bool, optional
+            Fetch images with hotspot clipping like the METASPACE website does.
+            The default is True.
+        scale_Intensity : bool or str, optional
+            How fetched images are scaled, passed to isotope_images() as
+            scale_intensity. True scales to the isotope intensity, False keeps
+            the intensities as they are, "TIC" normalizes to the total ion count.
+            The default is True.
+
+        Images fetched with other hotspot_Clipping or scale_Intensity values are
+        stored under other names, so caches with different settings can share
+        a directory.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.__cachePathName = cachePathName
+        self.__max_Bytes = max_Bytes
+        self.__hotspot_Clipping = hotspot_Clipping
+        self.__scale_Intensity = scale_Intensity
+        #put() and evict() from several threads must not remove each other's images
+        self.__lock = threading.Lock()
+        os.makedirs(cachePathName, exist_ok=True)
+
+    @property
+    def hotspot_Clipping(self):
+        return self.__hotspot_Clipping
+
+    @property
+    def scale_Intensity(self):
+        return self.__scale_Intensity
+
+    def path(self, dataset_ID: str, formula: str, adduct: str):
+        '''
+        Returns the path name of an ion image in the cache.
+
+        '''
+        settings = "_hc" + str(int(bool(self.__hotspot_Clipping))) + "_si" + str(self.__scale_Intensity)
+        #adducts like "[M]+" have characters that do not belong in file names
+        fileName = re.sub(r"[^A-Za-z0-9+\-.]", "_", dataset_ID + "_" + formula + adduct + settings)
+        return os.path.join(self.__cachePathName, fileName + ".npy")
+
+    def contains(self, dataset_ID: str, formula: str, adduct: str):
+        return os.path.exists(self.path(dataset_ID, formula, adduct))
+
+    def get(self, dataset_ID: str, formula: str, adduct: str):
+        '''
+        Returns a cached ion image as a read only memory-mapped array, only
+        the parts of the image that are used are read into memory.
+
+        Returns
+        -------
+        np.memmap or None
+            The ion image, or None when it is not cached.
+
+        '''
+        path = self.path(dataset_ID, formula, adduct)
+        try:
+            image = np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        #the modification time marks when an image was last used for eviction,
+        #the file may have been evicted since it was mapped but the mapping stays valid
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return image
+
+    def put(self, dataset_ID: str, formula: str, adduct: str, image: np.ndarray):
+        '''
+        Store an ion image in the cache, then evict images if the cache is too large.
+
+        Returns
+        -------
+        np.memmap
+            The cached ion image as a read only memory-mapped array.
+
+        '''
+        path = self.path(dataset_ID, formula, adduct)
+        temp_Path = path + "." + str(os.getpid()) + "-" + str(threading.get_ident()) + ".tmp"
+        #np.save adds ".npy" to names that do not end with it
+        with open(temp_Path, "wb") as file:
+            np.save(file, np.asarray(image, dtype=np.float32))
+        #the temporary file is mapped before it is renamed, the mapping follows
+        #the file and stays valid even if another thread evicts it afterwards
+        image = np.load(temp_Path, mmap_mode="r")
+        with self.__lock:
+            os.replace(temp_Path, path)
+            self.__evict(keep=path)
+        return image
+
+    def evict(self, keep: str = None):
+        '''
+        Remove the least recently used images until the cache fits in max_Bytes.
+
+        Parameters
+        ----------
+        keep : str, optional
+            A path name which is never removed. The default is None.
+
+        Returns
+        -------
+        int
+            The number of removed images.
+
+        '''
+        with self.__lock:
+            return self.__evict(keep)
+
+    def __evict(self, keep: str = None):
+        entries = list()
+        for entry in os.scandir(self.__cachePathName):
+            if(entry.name.endswith(".npy")):
+                #another process sharing the cache may remove files while scanning
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(entry[1] for entry in entries)
+        removed = 0
+        #oldest first
+        for mtime, size, path in sorted(entries):
+            if(total <= self.__max_Bytes):
+                break
+            if(path == keep):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+def annotation_selections(df: pd.DataFrame(), molecules: list = None, fdr: float = 0.1):
+    '''
+    Make a list of (dataset ID, formula, adduct) tuples from the "Molecules"
+    column added by annotate().
+
+    Parameters
+    ----------
+    df : pd.DataFrame()
+        A dataframe of datasets with a "Molecules" column.
+    molecules : list, optional
+        Only select ions that match one of these keys, the same way as
+        filter_molecule(). The default is None, which selects all ions.
+    fdr : float, optional
+        Only select annotations with an FDR <= to this value.
+        The default is 0.1.
+
+    Returns
+    -------
+    selections : list
+        A list of (dataset ID, formula, adduct) tuples without duplicates.
+
+    '''
+    #a dictionary keeps the order of the selections and drops duplicates quickly
+    selections = dict()
+    for row in df[["ID", "Molecules"]].itertuples(index=False):
+        for annotation_DF in row[1]:
+            if(annotation_DF.empty):
+                continue
+            #results() indexes annotations by (formula, adduct)
+            for (formula, adduct), annotation in annotation_DF.iterrows():
+                if(annotation["fdr"] > fdr):
+                    continue
+                if(molecules and not any(re.search(key, annotation["ion"]) for key in molecules)):
+                    continue
+                selections[(row[0], formula, adduct)] = None
+    return list(selections)
+
+def fetch_ion_images(ms: metaspaceFetch, selections: list, cache: ionImageCache,
+                     threads: int = 8):
+    '''
+    Batch fetch the first isotope ion image for each selection. Images that
+    are already cached are not downloaded again.
+
+    Parameters
+    ----------
+    ms : metaspaceFetch
+        The connection to METASPACE.
+    selections : list
+        A list of (dataset ID, formula, adduct) tuples.
+    cache : ionImageCache
+        The cache to read from and store into. Images are fetched with the
+        cache's hotspot_Clipping and scale_Intensity settings.
+    threads : int, optional
+        How many images are downloaded at the same time. The default is 8.
+
+    Returns
+    -------
+    images : list
+        A memory-mapped array for each selection, in the same order. The
+        element is None when METASPACE has no image for the selection.
+
+    '''
+    #images are mapped as soon as they are found, the cache may evict their
+    #files before the batch is done but a mapped array stays valid
+    fetched = dict()
+    #cached images are mapped and marked as used before anything is stored,
+    #so evictions made while storing the missing images do not lose them
+    for selection in selections:
+        if(selection not in fetched):
+            image = cache.get(*selection)
+            if(image is not None):
+                fetched[selection] = image
+    missing = list(dict.fromkeys(selection for selection in selections if selection not in fetched))
+
+    if(missing):
+        #one search for all datasets instead of one per image
+        dataset_IDs = list(dict.fromkeys(selection[0] for selection in missing))
+        datasets = {ms.get_dataset_id(dataset): dataset
+                    for dataset in ms.search_metaspace(datasetID=dataset_IDs)}
+
+        def fetch(selection):
+            dataset = datasets.get(selection[0])
+            if(dataset is None):
+                return
+            try:
+                images = dataset.isotope_images(selection[1], selection[2],
+                                                only_first_isotope=True,
+                                                scale_intensity=cache.scale_Intensity,
+                                                hotspot_clipping=cache.hotspot_Clipping)
+            except LookupError:
+                return
+            if(images and images[0] is not None):
+                fetched[selection] = cache.put(*selection, images[0])
+
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(fetch, missing))
+
+    return [fetched.get(selection) for selection in selections]
+
+def _make_thumbnail(path: str, size: int):
+    #reads every n-th pixel of the memory-mapped image, not the whole image
+    image = np.load(path, mmap_mode="r")
+    stride = max(1, math.ceil(max(image.shape) / size))
+    thumbnail = np.array(image[::stride, ::stride], dtype=np.float32)
+    peak = thumbnail.max()
+    if(peak > 0):
+        thumbnail /= peak
+    return thumbnail
+
+def render_thumbnails(cache: ionImageCache, selections: list,
+                      outPathName: str = "./thumbnails.png", columns: int = 8,
+                      thumbnail_Size: int = 64, processes: int = None):
+    '''
+    Render a grid of thumbnails for cached ion images and save it as an image.
+    Thumbnails are made by a process pool. Selections that are not cached
+    are skipped, call fetch_ion_images() first.
+
+    Parameters
+    ----------
+    cache : ionImageCache
+        The cache the ion images are stored in.
+    selections : list
+        A list of (dataset ID, formula, adduct) tuples.
+    outPathName : str, optional
+        The path name of the saved grid. The default is "./thumbnails.png".
+    columns : int, optional
+        The number of thumbnails in each row. The default is 8.
+    thumbnail_Size : int, optional
+        The longest side of a thumbnail in pixels. The default is 64.
+    processes : int, optional
+        The number of processes making thumbnails. The default is None,
+        which uses one per CPU.
+
+    Returns
+    -------
+    outPathName : str
+        The path name of the saved grid, or None if nothing was cached.
+
+    '''
+    selections = [selection for selection in selections if cache.contains(*selection)]
+    if(len(selections) == 0):
+        return None
+
+    #only the path names are sent to the worker processes, not the images
+    paths = [cache.path(*selection) for selection in selections]
+    with ProcessPoolExecutor(processes) as pool:
+        thumbnails = list(pool.map(_make_thumbnail, paths, repeat(thumbnail_Size),
+                                   chunksize=max(1, len(paths) // 64)))
+
+    columns = min(columns, len(thumbnails))
+    rows = math.ceil(len(thumbnails) / columns)
+    fig, axes = plt.subplots(rows, columns, figsize=(columns * 1.5, rows * 1.7), squeeze=False)
+    for ax in axes.flat:
+        ax.axis("off")
+    for ax, selection, thumbnail in zip(axes.flat, selections, thumbnails):
+        ax.imshow(thumbnail, cmap="viridis", interpolation="none")
+        ax.set_title(selection[0] + "\n" + selection[1] + selection[2], fontsize=6)
+    fig.tight_layout()
+    fig.savefig(outPathName, dpi=150)
+    plt.close(fig)
+
+    return outPathName
@@ -3,13 +3,171 @@
 import pandas as pd
 import os
 import re
+import numbers
 import matplotlib.pyplot as plt
 import numpy as np
 from metaspace import SMInstance
 
+def _section(dictionary, key: str):
+    #returns a nested dictionary, or an empty one when it is missing or None
+    value = dictionary.get(key) if isinstance(dictionary, dict) else None
+    return value if isinstance(value, dict) else {}
+
+def _value(dictionary, key: str):
+    #returns a field, or "N/A" when it is missing, None, or empty
+    value = dictionary.get(key) if isinstance(dictionary, dict) else None
+    return "N/A" if value is None or value == "" else value
+
+def _number(value):
+    #numbers stored as text become floats, missing values become "N/A",
+    #text that is not a number is kept as it is
+    if(value is None or value == "" or value == "N/A"):
+        return "N/A"
+    if(isinstance(value, numbers.Real)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+def _info(dataset):
+    return dataset._info if isinstance(dataset._info, dict) else {}
+
+def _metadata(dataset):
+    return dataset._metadata if isinstance(dataset._metadata, dict) else {}
+
+#how each field of a datasetRecord is read from an SMDataset object, shared by
+#datasetRecord and the get_dataset_* functions which read a single field
+_FIELDS = {
+    "submitter": lambda dataset: _value(_info(dataset), "submitter"),
+    "group": lambda dataset: _value(_info(dataset), "group"),
+    "analyzer": lambda dataset: _value(_section(_metadata(dataset), "MS_Analysis"), "Analyzer"),
+    "metadata_type": lambda dataset: _value(_info(dataset), "metadataType"),
+    "ionisation_source": lambda dataset: _value(_info(dataset), "ionisationSource"),
+    "organism": lambda dataset: _value(_info(dataset), "organism"),
+    "organism_part": lambda dataset: _value(_info(dataset), "organismPart"),
+    "adducts": lambda dataset: list(dataset.adducts or []),
+    "condition": lambda dataset: _value(_info(dataset), "condition"),
+    "maldi_matrix": lambda dataset: _value(_info(dataset), "maldiMatrix"),
+    "growth_conditions": lambda dataset: _value(_info(dataset), "growthConditions"),
+    "polarity": lambda dataset: _value(_info(dataset), "polarity"),
+    "resolving_power": lambda dataset: _number(_section(_info(dataset), "analyzer").get("resolvingPower")),
+    "pixel_size": lambda dataset: _value(_section(_metadata(dataset), "MS_Analysis"), "Pixel_Size"),
+    "mz_value": lambda dataset: _number(_section(_section(_metadata(dataset), "MS_Analysis"),
+                                                 "Detector_Resolving_Power").get("mz")),
+    "maldi_matrix_app": lambda dataset: _value(_section(_metadata(dataset), "Sample_Preparation"),
+                                               "MALDI_Matrix_Application"),
+    "sample_stabilisation": lambda dataset: _value(_section(_metadata(dataset), "Sample_Preparation"),
+                                                   "Sample_Stabilisation"),
+    "solvent": lambda dataset: _value(_section(_metadata(dataset), "Sample_Preparation"), "Solvent"),
+    "tissue_modification": lambda dataset: _value(_section(_metadata(dataset), "Sample_Preparation"),
+                                                  "Tissue_Modification"),
+    "additional_info": lambda dataset: _value(_metadata(dataset), "Additional_Information"),
+}
+
+class datasetRecord():
+    '''
+    The information make_dataframe() uses from an SMDataset object, read
+    once from its nested dictionaries. Missing or null values are "N/A"
+    instead of raising KeyError. Resolving power and mz value are floats
+    when they are numbers.
+    '''
+
+    #slots keep each record small, there is one per dataset in a catalog
+    __slots__ = ("name", "id", "dataset", "submitter", "group", "analyzer",
+                 "metadata_type", "ionisation_source", "organism", "organism_part",
+                 "adducts", "condition", "maldi_matrix", "growth_conditions",
+                 "polarity", "resolving_power", "pixel_size", "mz_value",
+                 "maldi_matrix_app", "sample_stabilisation", "solvent",
+                 "tissue_modification", "additional_info")
+
+    #the dataframe columns made by make_dataframe(), in the same order as __slots__
+    COLUMNS = ["Name","ID","SMDataset Object","Submitter","Group",
+               "Analyzer","Metadata Type","Ionisation Source",
+               "Organism","Organism Part","Adducts","Condition",
+               "Maldi Matrix","Growth Conditions","Polarity",
+               "Resolving Power","Pixel Size","MZ Value",
+               "MALDI Matrix Application","Sample Stabilisation",
+               "Solvent","Tissue Modification",
+               "Additional Information"]
+
+    def __init__(self, dataset, keep_Dataset: bool = True):
+        '''
+        Read a dataset's information into a record.
+
+        Parameters
+        ----------
+        dataset : SMDataset object
+            An object that represents a dataset on METASPACE.
+        keep_Dataset : bool, optional
+            Make "False" to not keep a reference to the SMDataset object.
+            It is only needed by remote operations like annotate() and
+            downloading. The default is True.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.name = dataset.name
+        self.id = dataset.id
+        self.dataset = dataset if keep_Dataset else None
+        for field, read in _FIELDS.items():
+            setattr(self, field, read(dataset))
+
+    @staticmethod
+    def read(dataset, field: str):
+        '''
+        Read a single field of a dataset without making a whole record.
+
+        Parameters
+        ----------
+        dataset : SMDataset object or datasetRecord
+            An object that represents a dataset on METASPACE.
+        field : str
+            A name in __slots__, like "polarity".
+
+        Returns
+        -------
+        The field's value, the same as the record's attribute.
+
+        '''
+        if(isinstance(dataset, datasetRecord) or field not in _FIELDS):
+            return getattr(dataset, field)
+        return _FIELDS[field](dataset)
+
+    @classmethod
+    def from_row(cls, row):
+        '''
+        Make a record from a dataframe row made by make_dataframe(), in the
+        order of COLUMNS. Nothing is read from the SMDataset object.
+
+        '''
+        record = cls.__new__(cls)
+        for field, value in zip(cls.__slots__, row):
+            setattr(record, field, value)
+        return record
+
+    def row(self):
+        '''
+        Returns the record as a list in the order of COLUMNS.
+
+        '''
+        return [getattr(self, field) for field in self.__slots__]
+
+    def pixel_axis(self, axis: str):
+        '''
+        Returns the pixel size along "Xaxis" or "Yaxis", or None when it is missing.
+
+        '''
+        if(not isinstance(self.pixel_size, dict)):
+            return None
+        value = _number(self.pixel_size.get(axis))
+        return value if isinstance(value, numbers.Real) else None
+
 class metaspaceFetch():
     
-    def __init__(self, downloadPathName: str ="./data/"):
+    def __init__(self, downloadPathName: str ="./data/", host: str = None):
         '''
         Setup metaspaceFetch class
 
@@ -18,20 +176,29 @@ class metaspaceFetch():
         downloadPathName : str, optional
             The path name where downloaded datasets are located. 
             The default is "./data/".
+        host : str, optional
+            The METASPACE server to connect to, e.g. the url of a replayServer.
+            The default is None, which uses the METASPACE API's default server.
 
         Returns
         -------
         None.
 
         '''
-        self.__SM = self.setup_connection()
+        self.__SM = self.setup_connection(host)
         self.__downloadPathName = downloadPathName
         
         
-    def setup_connection(self):
+    def setup_connection(self, host: str = None):
         '''
         Setup connection to METASPACE server using METASPACE API
 
+        Parameters
+        ----------
+        host : str, optional
+            The METASPACE server to connect to. 
+            The default is None, which uses the METASPACE API's default server.
+
         Returns
         -------
         SMInstance : Class object for communication with METASPACE
@@ -39,7 +206,7 @@ class metaspaceFetch():
             METASPACE server.
 
         '''
-        return SMInstance()
+        return SMInstance(host=host)
 
     def search_metaspace(self,
                          keyword: str = None,
@@ -110,7 +277,7 @@ class metaspaceFetch():
         #returns a list of datasets
         return dataset_List
        
-    def make_dataframe(self, list_of_datasets: list): 
+    def make_dataframe(self, list_of_datasets: list, keep_Datasets: bool = True): 
         '''
         Make a dataframe of a list of SMObjects/datasets.
         
@@ -118,6 +285,12 @@ class metaspaceFetch():
         ----------
         list_of_datasets : list
             A list of SMObjects/datasets are required to make the dataframe.
+            datasetRecord objects can be given instead of SMObjects.
+        keep_Datasets : bool, optional
+            Make "False" to leave the "SMDataset Object" column empty, which
+            makes each row much smaller for large catalogs. annotate(),
+            filter_molecule(), and dataset_selection() then load the
+            SMObjects they need by ID. The default is True.
 
         Returns
         -------
@@ -128,42 +301,15 @@ class metaspaceFetch():
         '''        
         #if the list_of_datasets is not emtpy, then run
         if (list_of_datasets):
-            column_List = ["Name","ID","SMDataset Object","Submitter","Group",
-                           "Analyzer","Metadata Type","Ionisation Source",
-                           "Organism","Organism Part","Adducts","Condition",
-                           "Maldi Matrix","Growth Conditions","Polarity",
-                           "Resolving Power","Pixel Size","MZ Value",
-                           "MALDI Matrix Application","Sample Stabilisation",
-                           "Solvent","Tissue Modification",
-                           "Additional Information"]
-            
-            return pd.concat([pd.DataFrame([[
-                                         self.get_dataset_name(dataset),
-                                         self.get_dataset_id(dataset),
-                                         dataset,
-                                         self.get_dataset_submitter(dataset),
-                                         self.get_dataset_group(dataset),
-                                         self.get_dataset_analyzer(dataset),
-                                         self.get_dataset_metadatatype(dataset),
-                                         self.get_dataset_ionisationsource(dataset),
-                                         self.get_dataset_organism(dataset),
-                                         self.get_dataset_organismpart(dataset),
-                                         self.get_dataset_adducts(dataset),
-                                         self.get_dataset_condition(dataset),
-                                         self.get_dataset_maldimatrix(dataset),
-                                         self.get_dataset_growthconditions(dataset),
-                                         self.get_dataset_polarity(dataset),
-                                         self.get_dataset_resolvingpower(dataset),
-                                         self.get_dataset_pixelsize(dataset),
-                                         self.get_dataset_mzvalue(dataset),
-                                         self.get_dataset_maldimatrixapp(dataset),
-                                         self.get_dataset_sample_stabilisation(dataset),
-                                         self.get_dataset_solvent(dataset),
-                                         self.get_dataset_tissue_modification(dataset),
-                                         self.get_dataset_additionalinfo(dataset)
-                                         ]],
-                                         columns= column_List) for dataset in list_of_datasets],
-                                         ignore_index=True)
+            records = [dataset if isinstance(dataset, datasetRecord)
+                       else datasetRecord(dataset, keep_Dataset=keep_Datasets)
+                       for dataset in list_of_datasets]
+            rows = [record.row() for record in records]
+            if(not keep_Datasets):
+                for row in rows:
+                    row[2] = None
+            #one dataframe for all rows instead of one per dataset
+            return pd.DataFrame(rows, columns=datasetRecord.COLUMNS)
             
         #If the list_of_datasets is empty, then return an empty dataframe
         else:
@@ -261,201 +407,83 @@ class metaspaceFetch():
 
         '''
         
-        #a series of datasets
-        curr_Datasets = df["SMDataset Object"]
+        #a list of records, made from the dataframe's columns without reading the SMObjects
+        records = self.get_dataframe_records(df)
         
-        #a list for matched datasets, 
-        filtered_List = list()
-        
-        #runs a if branch if the corresponding parameter was given a list as an argument
+        #runs a filter if the corresponding parameter was given a list as an argument
+        #a record is kept when any key in the list matches it
         if(adducts):
-            #Goes through each dataset from the given dataframe
-            for dataset in curr_Datasets.items():
-                list_of_Adducts = self.get_dataset_adducts(dataset[1])
-                #Goes through each element/key of the given list to find a match
-                #when a match is found it stops to prevent duplications
-                for key in adducts:
-                    if(list_of_Adducts.count(key) != 0):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            #replaces curr_Datasets series with the new list of matched datasets        
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records
+                       if any(key in record.adducts for key in adducts)]
         
         if(analyzer):
-            for dataset in curr_Datasets.items():
-                for key in analyzer:
-                    if(key == self.get_dataset_analyzer(dataset[1])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break   
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.analyzer in analyzer]
         
         if(condition):
-            for dataset in curr_Datasets.items():
-                for key in condition:
-                    if(key == self.get_dataset_condition(dataset[1])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.condition in condition]
         
         if(groupName):
-            for dataset in curr_Datasets.items():
-                curr_Group = self.get_dataset_group(dataset[1])
-                if((curr_Group != "N/A") and (curr_Group != None)):
-                    for key in groupName:
-                        if(key == curr_Group.get("name", "N/A")):
-                            filtered_List.append(curr_Datasets[dataset[0]])
-                            break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.group != "N/A"
+                       and record.group.get("name", "N/A") in groupName]
         
         if(groupID):
-            for dataset in curr_Datasets.items():
-                curr_Group = self.get_dataset_group(dataset[1])
-                if((curr_Group != "N/A") and (curr_Group != None)):
-                    for key in groupID:
-                        if(key == curr_Group.get("id", "N/A")):
-                            filtered_List.append(curr_Datasets[dataset[0]])
-                            break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.group != "N/A"
+                       and record.group.get("id", "N/A") in groupID]
         
         if(groupShortName):
-            for dataset in curr_Datasets.items():
-                curr_Group = self.get_dataset_group(dataset[1])
-                if((curr_Group != "N/A") and (curr_Group != None)):
-                    for key in groupShortName:
-                        if(key == curr_Group.get("shortName", "N/A")):
-                            filtered_List.append(curr_Datasets[dataset[0]])
-                            break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.group != "N/A"
+                       and record.group.get("shortName", "N/A") in groupShortName]
         
         if(growthConditions):
-            for dataset in curr_Datasets.items():
-                for key in growthConditions:
-                    if(key == self.get_dataset_growthconditions(dataset[1])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records
+                       if record.growth_conditions in growthConditions]
         
         if (ionisationSource):
-            for dataset in curr_Datasets.items():
-                for key in ionisationSource:
-                    if(key == self.get_dataset_ionisationsource(dataset[1])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records
+                       if record.ionisation_source in ionisationSource]
         
         if(maldiMatrix):
-            for dataset in curr_Datasets.items():
-                for key in maldiMatrix:
-                    sequence = self.get_dataset_maldimatrix(dataset[1])
-                    pattern = key
-                    if(re.search(pattern,sequence)):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records
+                       if any(re.search(key, record.maldi_matrix) for key in maldiMatrix)]
         
         if(metadataType):
-            for dataset in curr_Datasets.items():
-                for key in metadataType:
-                    if(key == self.get_dataset_metadatatype(dataset[1])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.metadata_type in metadataType]
         
         #Filtering my organism is case sensitive. 
         #Ex: mouse will match with mouse, but "Mouse" will not match with mouse
         if(organism):
-            for dataset in curr_Datasets.items():
-                for key in organism:
-                    if(key == self.get_dataset_organism(dataset[1])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.organism in organism]
         
         #Filtering by organism part is case sensitive.
         #Ex: skin will match skin, but "Skin" will not match skin
         if(organismPart):
-            for dataset in curr_Datasets.items():
-                for  key in organismPart:
-                    if(key == self.get_dataset_organismpart(dataset[1])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.organism_part in organismPart]
             
         if(polarity):
-            for dataset in curr_Datasets.items():
-                for key in polarity:
-                    if(key.upper() == self.get_dataset_polarity(dataset[1]).upper()):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            keys = [key.upper() for key in polarity]
+            records = [record for record in records if record.polarity.upper() in keys]
         
         #finds a match if key <= to a datasets resolving power
         if(lessOrEq_ResolvingPower):
-            for dataset in curr_Datasets.items():
-                curr_ResolvingPower = self.get_dataset_resolvingpower(dataset[1])
-                if(curr_ResolvingPower != "N/A"):
-                    for key in lessOrEq_ResolvingPower:
-                        key = float(key)
-                        curr_ResolvingPower = float(curr_ResolvingPower)
-                        if(key <= curr_ResolvingPower):
-                            filtered_List.append(curr_Datasets[dataset[0]])
-                            break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if isinstance(record.resolving_power, numbers.Real)
+                       and any(float(key) <= record.resolving_power for key in lessOrEq_ResolvingPower)]
         
         #finds a match if key <= to a datasets pixel size (Xaxis)
         if(lessOrEq_PixelSize_Xaxis):
-            for dataset in curr_Datasets.items():
-                for key in lessOrEq_PixelSize_Xaxis:
-                    pixelSize = self.get_dataset_pixelsize(dataset[1])
-                    if(pixelSize == "N/A"):
-                        break
-                    elif(int(key) <= int(pixelSize["Xaxis"])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.pixel_axis("Xaxis") is not None
+                       and any(int(key) <= int(record.pixel_axis("Xaxis")) for key in lessOrEq_PixelSize_Xaxis)]
         
         #finds a match if key <= to a datasets pixel size (Yaxis)
         if(lessOrEq_PixelSize_Yaxis):
-            for dataset in curr_Datasets.items():
-                for key in lessOrEq_PixelSize_Yaxis:
-                    pixelSize = self.get_dataset_pixelsize(dataset[1])
-                    if(pixelSize == "N/A"):
-                        break
-                    elif(int(key) <= int(pixelSize["Yaxis"])):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
+            records = [record for record in records if record.pixel_axis("Yaxis") is not None
+                       and any(int(key) <= int(record.pixel_axis("Yaxis")) for key in lessOrEq_PixelSize_Yaxis)]
         
         #finds a match if key <= to a datasets mz value
         if(lessOrEq_mzValue):
-            for dataset in curr_Datasets.items():
-                for key in lessOrEq_mzValue:
-                    mz = self.get_dataset_mzvalue(dataset[1])
-                    if(mz == "N/A"):
-                        break
-                    elif(int(key) <= int(mz)):
-                        filtered_List.append(curr_Datasets[dataset[0]])
-                        break
-            curr_Datasets = pd.Series(data = filtered_List)
-            filtered_List = list()
-
-        return self.make_dataframe(curr_Datasets.tolist())
+            records = [record for record in records if isinstance(record.mz_value, numbers.Real)
+                       and any(int(key) <= int(record.mz_value) for key in lessOrEq_mzValue)]
+
+        return self.make_dataframe(records)
      
     def filter_molecule(self, df: pd.DataFrame(), molecules: list):
         '''
@@ -484,7 +512,7 @@ class metaspaceFetch():
         #becomes a series
         dataset_Annotations = df["Molecules"]
         
-        #a list for matched datasets
+        #a list for the index labels of matched datasets
         filtered_List = list()
         
         #goes through each dataset's annotations (which are dataframes) from the given dataframe
@@ -503,9 +531,7 @@ class metaspaceFetch():
                     for key in molecules:
                         #runs when it finds a match
                         if(re.search(pattern=key, string=mol[1])):
-                            temp_Dataset = df.iloc[dataset[0]]
-                            temp_Dataset = temp_Dataset["SMDataset Object"]
-                            filtered_List.append(temp_Dataset)
+                            filtered_List.append(dataset[0])
                             stopMark = True
                             break
                     if(stopMark):
@@ -517,7 +543,7 @@ class metaspaceFetch():
             return df
         #returns a new dataframe of matched datasets if some are found
         else:    
-            return self.annotate((self.make_dataframe(filtered_List)))
+            return self.annotate(self.make_dataframe(self.get_dataframe_records(df.loc[filtered_List])))
                             
     def annotate(self,df: pd.DataFrame()):
         '''
@@ -536,15 +562,19 @@ class metaspaceFetch():
 
         '''
         
-        #a series of datasets
-        datasets = df["SMDataset Object"]
+        #a list of datasets, the ones not kept in the dataframe are loaded by ID
+        datasets = self.get_dataset_objects(df)
         
         #a list of annotations/results
         #which is a dataframe of detected molecules from that dataset
         resultsList = list()
         
         #goes through each dataset
-        for dataset in datasets.items():
+        for dataset in enumerate(datasets):
+            #a dataset that is no longer on METASPACE has no annotations
+            if(dataset[1] is None):
+                resultsList.append(list())
+                continue
             databases = dataset[1].database_details
             #this keeps track of all the dataset's reults/annotations
             List = list()
@@ -583,6 +613,75 @@ class metaspaceFetch():
         '''
         return dataset.download_links()
  
+    def get_dataset_record(self, dataset):
+        '''
+        returns the datasetRecord of a dataset
+
+        Parameters
+        ----------
+        dataset : SMDataset object
+            An object that represents a dataset on METASPACE.
+
+        Returns
+        -------
+        datasetRecord
+            The dataset's information with "N/A" for missing values.
+
+        '''
+        if(isinstance(dataset, datasetRecord)):
+            return dataset
+        return datasetRecord(dataset, keep_Dataset=False)
+    
+    def get_dataframe_records(self, df: pd.DataFrame()):
+        '''
+        returns a datasetRecord for each row of a dataframe made by
+        make_dataframe(), read from its columns and not from the SMObjects
+
+        Parameters
+        ----------
+        df : pd.DataFrame()
+            A dataframe of SMObjects/datasets.
+
+        Returns
+        -------
+        list
+            A list of datasetRecord objects.
+
+        '''
+        #missing columns (e.g. "SMDataset Object" in merged partitions) become None
+        columns = [df[column].tolist() if column in df.columns else [None] * len(df)
+                   for column in datasetRecord.COLUMNS]
+        return [datasetRecord.from_row(row) for row in zip(*columns)]
+    
+    def get_dataset_objects(self, df: pd.DataFrame()):
+        '''
+        returns the SMDataset object of each row of a dataframe. Rows made
+        with keep_Datasets=False are loaded from METASPACE by ID, with one
+        search for all of them.
+
+        Parameters
+        ----------
+        df : pd.DataFrame()
+            A dataframe of SMObjects/datasets.
+
+        Returns
+        -------
+        list
+            A list of SMDataset objects, None for a dataset that was not found.
+
+        '''
+        if("SMDataset Object" in df.columns):
+            datasets = df["SMDataset Object"].tolist()
+        else:
+            datasets = [None] * len(df)
+        
+        missing = [dataset_ID for dataset_ID, dataset in zip(df["ID"], datasets) if dataset is None]
+        if(missing):
+            loaded = {dataset.id: dataset for dataset in self.search_metaspace(datasetID=missing)}
+            datasets = [loaded.get(dataset_ID) if dataset is None else dataset
+                        for dataset_ID, dataset in zip(df["ID"], datasets)]
+        return datasets
+ 
     def get_dataset_name(self, dataset):
         return dataset.name
 
@@ -590,64 +689,64 @@ class metaspaceFetch():
         return dataset.id
     
     def get_dataset_group(self, dataset):
-        return dataset._info.get("group", "N/A")
+        return datasetRecord.read(dataset, "group")
     
     def get_dataset_submitter(self, dataset):
-        return dataset._info.get("submitter", "N/A")
+        return datasetRecord.read(dataset, "submitter")
     
     def get_dataset_analyzer(self, dataset):
-        return dataset._metadata["MS_Analysis"].get("Analyzer", "N/A")
+        return datasetRecord.read(dataset, "analyzer")
     
     def get_dataset_condition(self, dataset):
-        return dataset._info.get("condition", "N/A")
+        return datasetRecord.read(dataset, "condition")
     
     def get_dataset_growthconditions(self, dataset):
-        return dataset._info.get("growthConditions", "N/A")
+        return datasetRecord.read(dataset, "growth_conditions")
     
     def get_dataset_ionisationsource(self, dataset):
-        return dataset._info.get("ionisationSource", "N/A")
+        return datasetRecord.read(dataset, "ionisation_source")
     
     def get_dataset_maldimatrix(self, dataset):
-        return dataset._info.get("maldiMatrix", "N/A")
+        return datasetRecord.read(dataset, "maldi_matrix")
     
     def get_dataset_metadatatype(self, dataset):
-        return dataset._info.get("metadataType", "N/A")
+        return datasetRecord.read(dataset, "metadata_type")
     
     def get_dataset_organism(self, dataset):
-        return dataset._info.get("organism", "N/A")
+        return datasetRecord.read(dataset, "organism")
     
     def get_dataset_organismpart(self, dataset):
-        return dataset._info.get("organismPart", "N/A")
+        return datasetRecord.read(dataset, "organism_part")
     
     def get_dataset_polarity(self, dataset):
-        return dataset._info.get("polarity", "N/A")
+        return datasetRecord.read(dataset, "polarity")
     
     def get_dataset_resolvingpower(self, dataset):
-        return dataset._info["analyzer"].get("resolvingPower", "N/A")
+        return datasetRecord.read(dataset, "resolving_power")
     
     def get_dataset_additionalinfo(self, dataset):
-        return dataset._metadata.get("Additional_Information", "N/A")
+        return datasetRecord.read(dataset, "additional_info")
     
     def get_dataset_pixelsize(self, dataset):
-        return dataset._metadata["MS_Analysis"].get("Pixel_Size", "N/A")
+        return datasetRecord.read(dataset, "pixel_size")
     
     def get_dataset_adducts(self,dataset):
-        return dataset.adducts
+        return datasetRecord.read(dataset, "adducts")
     
     def get_dataset_mzvalue(self, dataset):
-        return dataset._metadata["MS_Analysis"]["Detector_Resolving_Power"].get("mz", "N/A")
+        return datasetRecord.read(dataset, "mz_value")
     
     def get_dataset_maldimatrixapp(self, dataset):
-        return dataset._metadata["Sample_Preparation"].get("MALDI_Matrix_Application", "N/A")
+        return datasetRecord.read(dataset, "maldi_matrix_app")
     
     def get_dataset_sample_stabilisation(self, dataset):
-        return dataset._metadata["Sample_Preparation"].get("Sample_Stabilisation", "N/A")
+        return datasetRecord.read(dataset, "sample_stabilisation")
     
     def get_dataset_solvent(self, dataset):
-        return dataset._metadata["Sample_Preparation"].get("Solvent", "N/A")
+        return datasetRecord.read(dataset, "solvent")
     
     def get_dataset_tissue_modification(self, dataset):
-        return dataset._metadata["Sample_Preparation"].get("Tissue_Modification", "N/A")
+        return datasetRecord.read(dataset, "tissue_modification")
     
     def set_download_pathname(self, pathName):
         self.__downloadPathName = pathName
@@ -686,15 +785,15 @@ class metaspaceFetch():
         else:
             #when true it will download all datasets currently in the dataframe
             if(download_All):        
-                downloadDatasets = df["SMDataset Object"]
-                for dataset in downloadDatasets.items():
+                downloadDatasets = self.get_dataset_objects(df)
+                for dataset in enumerate(downloadDatasets):
                     print(dataset[1])
                     #self.__download_dataset(dataset[1])
             #runs when download_All is false
             else:
                 for dataset in selected_Datasets:
-                    curr_DS = df.loc[df[df_Column] == dataset, "SMDataset Object"]
-                    curr_DS = curr_DS.iloc[0]
+                    curr_DS = df.loc[df[df_Column] == dataset].iloc[:1]
+                    curr_DS = self.get_dataset_objects(curr_DS)[0]
                     print(curr_DS)
                     #self.__download_dataset(curr_DS)
 
@@ -0,0 +1,365 @@
+'''A local stand-in for the METASPACE server. It records real GraphQL and download traffic once, then replays it with configurable latency, bandwidth, and error injection for offline load testing.'''
+
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import quote, unquote
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+class replayServer():
+
+    #absolute URLs in responses, ending at a quote, an escaped quote, or whitespace
+    URL_PATTERN = re.compile(rb'https?://[^"\\\s]+')
+
+    #paths of this prefix forward to the quoted absolute URL that follows it
+    REMOTE_PREFIX = "/__remote__/"
+
+    #bodies are read and sent in chunks of this size
+    CHUNK_SIZE = 65536
+
+    #bodies larger than this are stored in files next to the cassette instead of
+    #in it, dataset downloads can be larger than SQLite's BLOB limit and than memory
+    BODY_LIMIT = 2**20
+
+    def __init__(self, cassettePathName: str = "./cassette.sqlite", mode: str = "replay",
+                 upstream: str = "https://metaspace2020.eu",
+                 latency_Seconds: float = 0.0, latency_Jitter: float = 0.0,
+                 bandwidth_Bytes: float = None, error_Rate: float = 0.0,
+                 seed: int = None, host: str = "127.0.0.1", port: int = 0,
+                 upstream_Timeout: float = 60.0):
+        '''
+        Setup replayServer class
+
+        Parameters
+        ----------
+        cassettePathName : str, optional
+            The path name of the SQLite file which holds recorded responses.
+            Bodies larger than BODY_LIMIT are stored in the directory
+            "<cassettePathName>.bodies". The default is "./cassette.sqlite".
+        mode : str, optional
+            "record" forwards every request to upstream and stores the response.
+            "replay" only serves stored responses. The default is "replay".
+        upstream : str, optional
+            The METASPACE server to record from. The default is "https://metaspace2020.eu".
+        latency_Seconds : float, optional
+            Added delay before each response. The default is 0.0.
+        latency_Jitter : float, optional
+            A random delay between 0 and this value added to latency_Seconds.
+            The default is 0.0.
+        bandwidth_Bytes : float, optional
+            Limits each response body to this many bytes per second.
+            The default is None, which does not limit bandwidth.
+        error_Rate : float, optional
+            The chance (0 to 1) a request is answered with a 503 error.
+            The default is 0.0.
+        seed : int, optional
+            Seed for latency jitter and error injection, makes a run repeatable.
+            Each request draws from the seed, the request, and how many times
+            the same request was made before, so the order concurrent requests
+            arrive in does not change what they get. The default is None.
+        host : str, optional
+            The address to listen on. The default is "127.0.0.1".
+        port : int, optional
+            The port to listen on. The default is 0, which picks a free port.
+        upstream_Timeout : float, optional
+            Seconds to wait on upstream while recording before answering with
+            a 502 error. The default is 60.0.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if(mode not in ("record", "replay")):
+            raise ValueError('mode must be "record" or "replay"')
+
+        self.__cassettePathName = cassettePathName
+        self.__bodiesPathName = cassettePathName + ".bodies"
+        self.__upstream_Timeout = upstream_Timeout
+        self.__mode = mode
+        self.__upstream = upstream.rstrip("/")
+        self.__latency_Seconds = latency_Seconds
+        self.__latency_Jitter = latency_Jitter
+        self.__bandwidth_Bytes = bandwidth_Bytes
+        self.__error_Rate = error_Rate
+        self.__seed = seed
+        self.__random = random.Random(seed)
+        self.__address = (host, port)
+        self.__server = None
+        self.__thread = None
+        self.__lock = threading.Lock()
+        self.reset_stats()
+
+        with closing(sqlite3.connect(cassettePathName)) as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                status INTEGER NOT NULL,
+                                content_type TEXT,
+                                body BLOB NOT NULL,
+                                path TEXT)""")
+            #cassettes recorded before bodies could be stored in files
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(responses)")]
+            if("path" not in columns):
+                conn.execute("ALTER TABLE responses ADD COLUMN path TEXT")
+            conn.commit()
+
+    @property
+    def url(self):
+        '''
+        The address to give to metaspaceFetch(host=...) while the server is running.
+
+        '''
+        host, port = self.__server.server_address[:2]
+        return "http://" + host + ":" + str(port)
+
+    def start(self):
+        '''
+        Start serving requests on a background thread.
+
+        Returns
+        -------
+        str
+            The url of the server.
+
+        '''
+        self.reset_stats()
+        self.__server = ThreadingHTTPServer(self.__address, self.__make_handler())
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self.url
+
+    def stop(self):
+        if(self.__server is not None):
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__thread.join()
+            self.__server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self.__lock:
+            self.__durations = list()
+            self.__errors = 0
+            self.__bytes = 0
+            self.__first_Start = None
+            self.__last_End = None
+            #how many times each request was made, for seeded injection
+            self.__occurrences = dict()
+
+    def stats(self):
+        '''
+        Returns a dictionary with the number of requests served, errors,
+        bytes sent, throughput, and the latency percentiles (in seconds) of
+        the requests served since the server started or reset_stats() was called.
+
+        '''
+        with self.__lock:
+            durations = np.array(self.__durations)
+            elapsed = (self.__last_End - self.__first_Start) if durations.size else 0.0
+            stats = {"requests": int(durations.size), "errors": self.__errors,
+                     "bytes": self.__bytes, "elapsed": elapsed,
+                     "requests_per_second": durations.size / elapsed if elapsed else 0.0}
+        for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)):
+            stats[name] = float(np.percentile(durations, q)) if durations.size else 0.0
+        return stats
+
+    def __key(self, method: str, target: str, body: bytes):
+        #graphql bodies are normalized so the order of json keys does not matter
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True).encode()
+        except ValueError:
+            pass
+        return hashlib.sha256(method.encode() + b" " + target.encode() + b"\n" + body).hexdigest()
+
+    def __draw(self, key: str):
+        #returns the delay and whether to inject an error for a request
+        with self.__lock:
+            occurrence = self.__occurrences.get(key, 0)
+            self.__occurrences[key] = occurrence + 1
+            if(self.__seed is None):
+                generator = self.__random
+            else:
+                generator = random.Random(str(self.__seed) + "-" + key + "-" + str(occurrence))
+            return (self.__latency_Seconds + generator.uniform(0, self.__latency_Jitter),
+                    generator.random() < self.__error_Rate)
+
+    def __lookup(self, key: str):
+        with closing(sqlite3.connect(self.__cassettePathName)) as conn:
+            return conn.execute("SELECT status, content_type, body, path FROM responses WHERE key = ?",
+                                (key,)).fetchone()
+
+    def __record(self, key: str, method: str, target: str, headers, body: bytes):
+        request = urllib.request.Request(target, data=body or None, method=method,
+                                         headers={name: headers[name] for name in
+                                                  ("Content-Type", "Authorization", "Accept")
+                                                  if name in headers})
+        try:
+            try:
+                response = urllib.request.urlopen(request, timeout=self.__upstream_Timeout)
+            except urllib.error.HTTPError as error:
+                #error responses are recorded and replayed like any other
+                response = error
+            with response:
+                recorded = (response.status, response.headers.get("Content-Type")) + \
+                           self.__store_body(key, response)
+        except OSError as error:
+            #upstream could not be reached or stalled, nothing is recorded
+            return (502, "application/json",
+                    json.dumps({"error": "upstream failed: " + repr(error)}).encode(), None)
+
+        with closing(sqlite3.connect(self.__cassettePathName, timeout=60)) as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key,) + recorded)
+            conn.commit()
+        return recorded
+
+    def __store_body(self, key: str, response):
+        #keeps small bodies in memory and streams large ones to a file
+        body = bytearray()
+        file = None
+        path = os.path.join(self.__bodiesPathName, key)
+        temp_Path = path + "." + str(threading.get_ident()) + ".tmp"
+        try:
+            while True:
+                chunk = response.read(self.CHUNK_SIZE)
+                if(not chunk):
+                    break
+                if(file is not None):
+                    file.write(chunk)
+                    continue
+                body += chunk
+                if(len(body) > self.BODY_LIMIT):
+                    os.makedirs(self.__bodiesPathName, exist_ok=True)
+                    file = open(temp_Path, "wb")
+                    file.write(body)
+                    body = bytearray()
+        except BaseException:
+            if(file is not None):
+                file.close()
+                os.remove(temp_Path)
+            raise
+
+        if(file is None):
+            return (bytes(body), None)
+        file.close()
+        os.replace(temp_Path, path)
+        return (b"", path)
+
+    def __chunks(self, body: bytes, path: str):
+        if(path is None):
+            for i in range(0, len(body), self.CHUNK_SIZE):
+                yield body[i:i + self.CHUNK_SIZE]
+            return
+        with open(path, "rb") as file:
+            while True:
+                chunk = file.read(self.CHUNK_SIZE)
+                if(not chunk):
+                    return
+                yield chunk
+
+    def __count(self, start: float, status: int, size: int):
+        end = time.perf_counter()
+        with self.__lock:
+            self.__durations.append(end - start)
+            self.__bytes += size
+            if(status >= 400):
+                self.__errors += 1
+            if(self.__first_Start is None or start < self.__first_Start):
+                self.__first_Start = start
+            self.__last_End = end
+
+    def __rewrite(self, body: bytes):
+        #sends links to ion images and dataset downloads back through this server
+        prefix = (self.url + self.REMOTE_PREFIX).encode()
+        return self.URL_PATTERN.sub(lambda match: prefix + quote(match.group(0), safe="").encode(), body)
+
+    def __handle(self, handler):
+        start = time.perf_counter()
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+
+        #requests to upstream are keyed on their path only, so a cassette can be
+        #replayed for any upstream, remote links are keyed on their full url
+        if(handler.path.startswith(self.REMOTE_PREFIX)):
+            target = unquote(handler.path[len(self.REMOTE_PREFIX):])
+            key = self.__key(handler.command, target, body)
+        else:
+            target = self.__upstream + handler.path
+            key = self.__key(handler.command, handler.path, body)
+
+        delay, inject_Error = self.__draw(key)
+        time.sleep(delay)
+
+        if(inject_Error):
+            response = (503, "application/json", b'{"error": "injected error"}', None)
+        elif(self.__mode == "record"):
+            response = self.__record(key, handler.command, target, handler.headers, body)
+        else:
+            response = self.__lookup(key) or (404, "application/json",
+                                              b'{"error": "request was not recorded"}', None)
+
+        status, content_type, response_Body, path = response
+        if(content_type and "json" in content_type):
+            #json responses are small enough to rewrite in memory
+            if(path is not None):
+                with open(path, "rb") as file:
+                    response_Body = file.read()
+                path = None
+            response_Body = self.__rewrite(response_Body)
+        size = os.path.getsize(path) if path is not None else len(response_Body)
+
+        handler.send_response(status)
+        if(content_type):
+            handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(size))
+        if(size == 0):
+            self.__count(start, status, size)
+        handler.end_headers()
+
+        #sends the body in chunks, waiting before each one to limit bandwidth
+        chunks = self.__chunks(response_Body, path)
+        chunk = next(chunks, None)
+        while chunk is not None:
+            next_Chunk = next(chunks, None)
+            if(self.__bandwidth_Bytes):
+                time.sleep(len(chunk) / self.__bandwidth_Bytes)
+            #counted before the last write, so stats() includes the request
+            #as soon as the client has read the whole body
+            if(next_Chunk is None):
+                self.__count(start, status, size)
+            handler.wfile.write(chunk)
+            chunk = next_Chunk
+
+    def __make_handler(self):
+        #bound here, names starting with __ would be mangled inside the handler class
+        handle = self.__handle
+
+        class handler(BaseHTTPRequestHandler):
+            #requests keeps connections open between calls
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                handle(self)
+
+            def do_POST(self):
+                handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return handler
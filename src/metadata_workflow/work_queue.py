@@ -0,0 +1,545 @@
+'''Spread the annotate() and download work for a large list of datasets across several worker processes or nodes using a durable SQLite lease queue.'''
+
+import os
+import glob
+import time
+import socket
+import sqlite3
+import threading
+import traceback
+import multiprocessing as mp
+from contextlib import closing
+import pandas as pd
+from .metaspace_fetch import metaspaceFetch
+
+class leaseQueue():
+
+    def __init__(self, queuePathName: str = "./queue.sqlite",
+                 lease_Seconds: float = 300.0, max_Attempts: int = 3):
+        '''
+        Setup leaseQueue class, creates the queue file if it does not exist
+
+        Parameters
+        ----------
+        queuePathName : str, optional
+            The path name of the SQLite file which holds the queue. Every
+            worker and the coordinator must point at the same file. Workers
+            on other nodes need a shared filesystem with working POSIX
+            locks for SQLite (many NFS setups do not have them).
+            The default is "./queue.sqlite".
+        lease_Seconds : float, optional
+            How long a worker owns a claimed dataset before it is given
+            back to the queue. The default is 300.0.
+        max_Attempts : int, optional
+            How many times a dataset can be claimed before it is marked as
+            failed. The default is 3.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.__queuePathName = queuePathName
+        self.__lease_Seconds = lease_Seconds
+        self.__max_Attempts = max_Attempts
+
+        with closing(self.__connect()) as conn:
+            #a rollback journal only needs file locks, WAL needs memory shared
+            #between processes on one host and breaks on network filesystems
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute("""CREATE TABLE IF NOT EXISTS leases (
+                                dataset_id TEXT PRIMARY KEY,
+                                state TEXT NOT NULL DEFAULT 'pending',
+                                worker TEXT,
+                                expires REAL,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                error TEXT)""")
+
+    def __connect(self):
+        #isolation_level=None so transactions are only opened by an explicit BEGIN
+        return sqlite3.connect(self.__queuePathName, timeout=60, isolation_level=None)
+
+    def put(self, dataset_IDs: list):
+        '''
+        Place dataset IDs on the queue. IDs already on the queue are ignored,
+        so a coordinator can be restarted without redoing finished work.
+
+        Parameters
+        ----------
+        dataset_IDs : list
+            A list of METASPACE dataset IDs.
+
+        Returns
+        -------
+        None.
+
+        '''
+        with closing(self.__connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR IGNORE INTO leases (dataset_id) VALUES (?)",
+                             [(dataset_ID,) for dataset_ID in dataset_IDs])
+            conn.execute("COMMIT")
+
+    def claim(self, worker_ID: str):
+        '''
+        Claim the next pending dataset for a worker.
+
+        Parameters
+        ----------
+        worker_ID : str
+            A name that is unique to the worker claiming the lease.
+
+        Returns
+        -------
+        str or None
+            The claimed dataset ID, or None when nothing is pending.
+
+        '''
+        with closing(self.__connect()) as conn:
+            #BEGIN IMMEDIATE takes the write lock so two workers never claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            self.__requeue_expired(conn)
+            row = conn.execute("""SELECT dataset_id FROM leases WHERE state = 'pending'
+                                  ORDER BY rowid LIMIT 1""").fetchone()
+            if(row is None):
+                conn.execute("COMMIT")
+                return None
+            conn.execute("""UPDATE leases SET state = 'leased', worker = ?, expires = ?,
+                                              attempts = attempts + 1
+                            WHERE dataset_id = ?""",
+                         (worker_ID, time.time() + self.__lease_Seconds, row[0]))
+            conn.execute("COMMIT")
+            return row[0]
+
+    def renew(self, dataset_ID: str, worker_ID: str):
+        '''
+        Extend a lease held by a worker. Long downloads should call this so
+        the lease does not expire while the worker is still alive.
+
+        Returns
+        -------
+        bool
+            False if the worker no longer owns the lease.
+
+        '''
+        with closing(self.__connect()) as conn:
+            cursor = conn.execute("""UPDATE leases SET expires = ?
+                                     WHERE dataset_id = ? AND worker = ? AND state = 'leased'""",
+                                  (time.time() + self.__lease_Seconds, dataset_ID, worker_ID))
+            return cursor.rowcount == 1
+
+    def complete(self, dataset_ID: str, worker_ID: str):
+        '''
+        Mark a leased dataset as done.
+
+        Returns
+        -------
+        bool
+            False if the worker no longer owns the lease. The dataset was
+            then handed to another worker, which will write the same partition.
+
+        '''
+        with closing(self.__connect()) as conn:
+            cursor = conn.execute("""UPDATE leases SET state = 'done', expires = NULL, error = NULL
+                                     WHERE dataset_id = ? AND worker = ? AND state = 'leased'""",
+                                  (dataset_ID, worker_ID))
+            return cursor.rowcount == 1
+
+    def fail(self, dataset_ID: str, worker_ID: str, error: str = None):
+        '''
+        Give a leased dataset back to the queue after an error. It is marked
+        as failed once it has used up max_Attempts.
+
+        Returns
+        -------
+        None.
+
+        '''
+        with closing(self.__connect()) as conn:
+            conn.execute("""UPDATE leases
+                            SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                worker = NULL, expires = NULL, error = ?
+                            WHERE dataset_id = ? AND worker = ? AND state = 'leased'""",
+                         (self.__max_Attempts, error, dataset_ID, worker_ID))
+
+    def requeue_expired(self):
+        '''
+        Give expired leases back to the queue. Leases expire when a worker
+        crashes or stops before finishing a dataset.
+
+        Returns
+        -------
+        int
+            The number of leases that expired.
+
+        '''
+        with closing(self.__connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            count = self.__requeue_expired(conn)
+            conn.execute("COMMIT")
+            return count
+
+    def __requeue_expired(self, conn):
+        cursor = conn.execute("""UPDATE leases
+                                 SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                     worker = NULL, expires = NULL, error = 'lease expired'
+                                 WHERE state = 'leased' AND expires < ?""",
+                              (self.__max_Attempts, time.time()))
+        return cursor.rowcount
+
+    def counts(self):
+        '''
+        Returns a dictionary with the number of datasets in each state
+        ("pending", "leased", "done", "failed").
+
+        '''
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        with closing(self.__connect()) as conn:
+            for state, count in conn.execute("SELECT state, COUNT(*) FROM leases GROUP BY state"):
+                counts[state] = count
+        return counts
+
+    def failed(self):
+        '''
+        Returns a dictionary of failed dataset IDs and their last error.
+
+        '''
+        with closing(self.__connect()) as conn:
+            return dict(conn.execute("SELECT dataset_id, error FROM leases WHERE state = 'failed'"))
+
+    def is_finished(self):
+        '''
+        Returns True when no dataset is pending or leased.
+
+        '''
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+def fetch_partition(ms: metaspaceFetch, dataset_ID: str, annotate: bool = True,
+                    download: bool = False, downloadPathName: str = "./data/"):
+    '''
+    The default work done by a worker for one dataset. Searches METASPACE for
+    the dataset, makes its dataframe row, and optionally annotates and
+    downloads it.
+
+    Parameters
+    ----------
+    ms : metaspaceFetch
+        The worker's own connection to METASPACE.
+    dataset_ID : str
+        The dataset ID claimed from the queue.
+    annotate : bool, optional
+        Make "True" to add the "Molecules" column. The default is True.
+    download : bool, optional
+        Make "True" to download the dataset. The default is False.
+    downloadPathName : str, optional
+        The path name where downloaded datasets are located.
+        The default is "./data/".
+
+    Returns
+    -------
+    pd.DataFrame()
+        A dataframe with one row for the dataset, without the
+        "SMDataset Object" column.
+
+    '''
+    df = ms.make_dataframe(ms.search_metaspace(datasetID=[dataset_ID]))
+    if(df.empty):
+        raise LookupError("Dataset " + dataset_ID + " was not found on METASPACE")
+
+    if(annotate):
+        df = ms.annotate(df)
+
+    if(download):
+        for dataset in df["SMDataset Object"].items():
+            dataset[1].download_to_dir(os.path.join(downloadPathName, ms.get_dataset_name(dataset[1])))
+
+    #the SMDataset object holds the worker's connection and can not be written to disk
+    return df.drop(columns=["SMDataset Object"])
+
+def write_partition(df: pd.DataFrame(), outputPathName: str, dataset_ID: str):
+    '''
+    Write one dataset's dataframe to the output directory. The file is
+    written under a temporary name and renamed, so a crashed worker never
+    leaves a half written partition behind.
+
+    Returns
+    -------
+    path : str
+        The path name of the partition.
+
+    '''
+    os.makedirs(outputPathName, exist_ok=True)
+    path = os.path.join(outputPathName, dataset_ID + ".pkl")
+    temp_Path = path + "." + str(os.getpid()) + ".tmp"
+    #pickle keeps the "Molecules" column, which is a list of dataframes
+    pd.to_pickle(df, temp_Path)
+    os.replace(temp_Path, path)
+    return path
+
+def process_with_heartbeat(queue: leaseQueue, dataset_ID: str, worker_ID: str,
+                           process_Dataset, heartbeat_Seconds: float):
+    '''
+    Run process_Dataset for a claimed dataset while a background thread
+    renews its lease, so work that takes longer than lease_Seconds is not
+    handed to another worker.
+
+    Returns
+    -------
+    (pd.DataFrame(), bool)
+        The dataset's dataframe, and False if the lease was lost while it ran.
+
+    '''
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(heartbeat_Seconds):
+            if(not queue.renew(dataset_ID, worker_ID)):
+                lost.set()
+                return
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        df = process_Dataset(dataset_ID)
+    finally:
+        stop.set()
+        thread.join()
+
+    #one last renewal, the lease could have run out since the last heartbeat
+    return df, not lost.is_set() and queue.renew(dataset_ID, worker_ID)
+
+def run_worker(queuePathName: str, outputPathName: str, worker_ID: str = None,
+               annotate: bool = True, download: bool = False,
+               downloadPathName: str = "./data/", lease_Seconds: float = 300.0,
+               poll_Seconds: float = 5.0, process_Dataset = None,
+               max_Attempts: int = 3):
+    '''
+    Claim datasets from the queue until it is finished and write a partition
+    for each one. Run this on every node (or process) that shares the queue file.
+
+    Parameters
+    ----------
+    queuePathName : str
+        The path name of the SQLite queue file.
+    outputPathName : str
+        The directory where partitions are written.
+    worker_ID : str, optional
+        A name unique to this worker. The default is "<hostname>-<pid>".
+    annotate : bool, optional
+        Make "True" to add the "Molecules" column. The default is True.
+    download : bool, optional
+        Make "True" to download each dataset. The default is False.
+    downloadPathName : str, optional
+        The path name where downloaded datasets are located.
+        The default is "./data/".
+    lease_Seconds : float, optional
+        How long a claimed dataset is owned by this worker. The default is 300.0.
+    poll_Seconds : float, optional
+        How long to wait for other workers' leases to finish or expire when
+        nothing is pending. The default is 5.0.
+    process_Dataset : callable, optional
+        Replaces fetch_partition(). Called with a dataset ID and must return
+        a dataframe. It must be a module level function when workers are
+        started by coordinate(), which starts them with "spawn".
+        The default is None.
+    max_Attempts : int, optional
+        How many times a dataset can be claimed before it is marked as
+        failed. The default is 3.
+
+    Returns
+    -------
+    int
+        The number of datasets this worker completed.
+
+    '''
+    if(worker_ID is None):
+        worker_ID = socket.gethostname() + "-" + str(os.getpid())
+
+    queue = leaseQueue(queuePathName, lease_Seconds=lease_Seconds, max_Attempts=max_Attempts)
+
+    #each worker makes its own connection to METASPACE
+    if(process_Dataset is None):
+        ms = metaspaceFetch(downloadPathName)
+        process_Dataset = lambda dataset_ID: fetch_partition(ms, dataset_ID, annotate,
+                                                             download, downloadPathName)
+
+    completed = 0
+    while True:
+        dataset_ID = queue.claim(worker_ID)
+        if(dataset_ID is None):
+            if(queue.is_finished()):
+                break
+            #other workers still hold leases, wait in case one of them expires
+            time.sleep(poll_Seconds)
+            continue
+
+        try:
+            df, owned = process_with_heartbeat(queue, dataset_ID, worker_ID,
+                                               process_Dataset, lease_Seconds / 3)
+            #the dataset was handed to another worker, which writes the partition
+            if(not owned):
+                continue
+            write_partition(df, outputPathName, dataset_ID)
+        except Exception as error:
+            queue.fail(dataset_ID, worker_ID, repr(error))
+            continue
+
+        if(queue.complete(dataset_ID, worker_ID)):
+            completed += 1
+
+    return completed
+
+def merge_partitions(outputPathName: str, dataset_IDs: list = None, ms: metaspaceFetch = None):
+    '''
+    Reassemble the partitions written by the workers into one dataframe.
+
+    Parameters
+    ----------
+    outputPathName : str
+        The directory where partitions were written.
+    dataset_IDs : list, optional
+        Merge these datasets in this order. Missing partitions are skipped.
+        The default is None, which merges every partition.
+    ms : metaspaceFetch, optional
+        When given, the "SMDataset Object" column is restored by searching
+        METASPACE for the merged dataset IDs. The default is None.
+
+    Returns
+    -------
+    pd.DataFrame()
+        A dataframe of the merged datasets.
+
+    '''
+    if(dataset_IDs is None):
+        paths = sorted(glob.glob(os.path.join(outputPathName, "*.pkl")))
+    else:
+        paths = [os.path.join(outputPathName, dataset_ID + ".pkl") for dataset_ID in dataset_IDs]
+        paths = [path for path in paths if os.path.exists(path)]
+
+    if(len(paths) == 0):
+        return pd.DataFrame()
+
+    df = pd.concat([pd.read_pickle(path) for path in paths], ignore_index=True)
+
+    if(ms is not None):
+        datasets = ms.search_metaspace(datasetID=df["ID"].tolist())
+        datasets = {ms.get_dataset_id(dataset): dataset for dataset in datasets}
+        #same position make_dataframe() puts the column in
+        df.insert(df.columns.get_loc("ID") + 1, "SMDataset Object",
+                  [datasets.get(dataset_ID) for dataset_ID in df["ID"]])
+
+    return df
+
+def coordinate(dataset_IDs: list, queuePathName: str = "./queue.sqlite",
+               outputPathName: str = "./partitions/", workers: int = 2,
+               annotate: bool = True, download: bool = False,
+               downloadPathName: str = "./data/", lease_Seconds: float = 300.0,
+               poll_Seconds: float = 5.0, process_Dataset = None,
+               max_Attempts: int = 3, max_Restarts: int = 3,
+               ms: metaspaceFetch = None):
+    '''
+    Queue the datasets, run local worker processes until the queue is
+    finished, then merge their partitions. Workers on other nodes can join
+    by calling run_worker() with the same queue file and output directory.
+
+    Workers that crash are restarted while work is left, and their leases
+    are given back to the queue once they expire. A worker that keeps
+    crashing without any dataset being finished stops the run.
+
+    Parameters
+    ----------
+    dataset_IDs : list
+        A list of METASPACE dataset IDs.
+    queuePathName : str, optional
+        The path name of the SQLite queue file. The default is "./queue.sqlite".
+    outputPathName : str, optional
+        The directory where partitions are written. The default is "./partitions/".
+    workers : int, optional
+        The number of local worker processes. The default is 2.
+    max_Restarts : int, optional
+        How many times a worker is restarted in a row while no dataset is
+        done or failed. The default is 3.
+    ms : metaspaceFetch, optional
+        Passed on to merge_partitions() to restore the "SMDataset Object"
+        column. The default is None.
+
+    The other parameters are passed on to run_worker().
+
+    Returns
+    -------
+    pd.DataFrame()
+        A dataframe of the merged datasets. Failed datasets are left out.
+
+    Raises
+    ------
+    RuntimeError
+        When a worker crashed more than max_Restarts times in a row.
+
+    '''
+    queue = leaseQueue(queuePathName, lease_Seconds=lease_Seconds, max_Attempts=max_Attempts)
+    queue.put(dataset_IDs)
+
+    worker_Args = dict(queuePathName=queuePathName, outputPathName=outputPathName,
+                       annotate=annotate, download=download,
+                       downloadPathName=downloadPathName, lease_Seconds=lease_Seconds,
+                       poll_Seconds=poll_Seconds, process_Dataset=process_Dataset,
+                       max_Attempts=max_Attempts)
+    #spawn behaves the same on every platform, workers do not inherit the
+    #coordinator's memory and each one makes its own connection
+    context = mp.get_context("spawn")
+    #workers send the traceback of an error that stops them here
+    errors = context.Queue()
+
+    def start_worker():
+        process = context.Process(target=_worker_main, args=(errors, worker_Args))
+        process.start()
+        return process
+
+    processes = [start_worker() for i in range(workers)]
+    restarts = [0] * workers
+    last_Error = None
+    progress = -1
+
+    try:
+        while not queue.is_finished():
+            time.sleep(poll_Seconds)
+            queue.requeue_expired()
+
+            counts = queue.counts()
+            #a finished dataset means the workers are not crashing on startup
+            if(counts["done"] + counts["failed"] > progress):
+                progress = counts["done"] + counts["failed"]
+                restarts = [0] * workers
+
+            while not errors.empty():
+                last_Error = errors.get()
+
+            #restarts workers that crashed while there is still work left
+            for i, process in enumerate(processes):
+                if(not process.is_alive() and process.exitcode != 0):
+                    if(restarts[i] >= max_Restarts):
+                        raise RuntimeError("A worker crashed " + str(restarts[i] + 1) +
+                                           " times without any progress, last error:\n" +
+                                           (last_Error or "exit code " + str(process.exitcode)))
+                    restarts[i] += 1
+                    processes[i] = start_worker()
+    finally:
+        for process in processes:
+            if(process.is_alive() and not queue.is_finished()):
+                process.terminate()
+            process.join()
+
+    failed = queue.failed()
+    return merge_partitions(outputPathName,
+                            [dataset_ID for dataset_ID in dataset_IDs if dataset_ID not in failed],
+                            ms)
+
+def _worker_main(errors, worker_Args: dict):
+    #runs in a worker process started by coordinate()
+    try:
+        run_worker(**worker_Args)
+    except BaseException:
+        errors.put(traceback.format_exc())
+        raise
@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from metadata_workflow import ion_images as ii
+
+#each test image is 10x10 float32, 400 bytes plus the .npy header
+IMAGE_BYTES = 528
+
+class fakeDataset():
+
+    def __init__(self, dataset_ID):
+        self.id = dataset_ID
+        self.calls = list()
+
+    def isotope_images(self, formula, adduct, only_first_isotope=False,
+                       scale_intensity=True, hotspot_clipping=False):
+        self.calls.append((formula, adduct, scale_intensity, hotspot_clipping))
+        if(formula == "missing"):
+            raise LookupError(formula)
+        value = 2.0 if hotspot_clipping else 1.0
+        return [np.full((10, 10), value)]
+
+class fakeFetch():
+
+    def __init__(self, datasets):
+        self.datasets = {dataset.id: dataset for dataset in datasets}
+        self.searches = list()
+
+    def search_metaspace(self, datasetID=None):
+        self.searches.append(datasetID)
+        return [self.datasets[ID] for ID in datasetID if ID in self.datasets]
+
+    def get_dataset_id(self, dataset):
+        return dataset.id
+
+def test_concurrent_puts_keep_their_images(tmp_path):
+    cache = ii.ionImageCache(str(tmp_path), max_Bytes=5 * IMAGE_BYTES)
+
+    def put(i):
+        return cache.put("ds", "C" + str(i), "+H", np.full((10, 10), i))
+
+    with ThreadPoolExecutor(8) as pool:
+        images = list(pool.map(put, range(200)))
+
+    assert [float(image[0, 0]) for image in images] == list(range(200))
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".npy")]) <= 5
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = ii.ionImageCache(str(tmp_path), max_Bytes=10 * IMAGE_BYTES)
+    for i, formula in enumerate(["C1", "C2", "C3"]):
+        cache.put("ds", formula, "+H", np.zeros((10, 10)))
+        os.utime(cache.path("ds", formula, "+H"), (i, i))
+    #reading an image marks it as used
+    cache.get("ds", "C1", "+H")
+
+    ii.ionImageCache(str(tmp_path), max_Bytes=IMAGE_BYTES).evict()
+
+    assert [cache.contains("ds", formula, "+H") for formula in ["C1", "C2", "C3"]] == [True, False, False]
+
+def test_fetch_keeps_cached_images_evicted_by_the_batch(tmp_path):
+    cache = ii.ionImageCache(str(tmp_path), max_Bytes=IMAGE_BYTES)
+    cache.put("ds", "cached", "+H", np.full((10, 10), 7.0))
+    dataset = fakeDataset("ds")
+    ms = fakeFetch([dataset])
+    selections = [("ds", "cached", "+H"), ("ds", "C1", "+H"), ("ds", "missing", "+H"),
+                  ("other", "C1", "+H"), ("ds", "C1", "+H")]
+
+    images = ii.fetch_ion_images(ms, selections, cache, threads=2)
+
+    #storing C1 evicted the cached image, it was mapped before that
+    assert not cache.contains("ds", "cached", "+H")
+    assert float(images[0][0, 0]) == 7.0
+    assert float(images[1][0, 0]) == 2.0
+    assert images[2] is None and images[3] is None
+    assert float(images[4][0, 0]) == 2.0
+    assert ms.searches == [["ds", "other"]]
+    assert sorted(call[0] for call in dataset.calls) == ["C1", "missing"]
+
+def test_cache_settings_are_part_of_the_key(tmp_path):
+    dataset = fakeDataset("ds")
+    ms = fakeFetch([dataset])
+    clipped = ii.ionImageCache(str(tmp_path), hotspot_Clipping=True)
+    raw = ii.ionImageCache(str(tmp_path), hotspot_Clipping=False, scale_Intensity="TIC")
+
+    ii.fetch_ion_images(ms, [("ds", "C1", "+H")], clipped)
+    assert not raw.contains("ds", "C1", "+H")
+    image = ii.fetch_ion_images(ms, [("ds", "C1", "+H")], raw)[0]
+
+    assert float(image[0, 0]) == 1.0
+    assert clipped.path("ds", "C1", "+H") != raw.path("ds", "C1", "+H")
+    assert dataset.calls == [("C1", "+H", True, True), ("C1", "+H", "TIC", False)]
+
+def test_annotation_selections_drop_duplicates():
+    annotations = pd.DataFrame({"fdr": [0.05, 0.2, 0.05], "ion": ["C1+H", "C2+H", "C3+Na"]},
+                               index=pd.MultiIndex.from_tuples([("C1", "+H"), ("C2", "+H"), ("C3", "+Na")]))
+    df = pd.DataFrame({"ID": ["ds", "ds"], "Molecules": [[annotations], [annotations, pd.DataFrame()]]})
+
+    assert ii.annotation_selections(df) == [("ds", "C1", "+H"), ("ds", "C3", "+Na")]
+    assert ii.annotation_selections(df, molecules=["Na"]) == [("ds", "C3", "+Na")]
+
+def test_render_thumbnails(tmp_path):
+    cache = ii.ionImageCache(str(tmp_path / "cache"))
+    cache.put("ds", "C1", "+H", np.arange(10000.0).reshape(100, 100))
+    cache.put("ds", "C2", "+H", np.zeros((20, 30)))
+    selections = [("ds", "C1", "+H"), ("ds", "C2", "+H"), ("ds", "C3", "+H")]
+
+    thumbnail = ii._make_thumbnail(cache.path("ds", "C1", "+H"), 10)
+    assert thumbnail.shape == (10, 10) and thumbnail.max() == 1.0
+
+    outPathName = ii.render_thumbnails(cache, selections, str(tmp_path / "grid.png"), processes=2)
+    assert outPathName == str(tmp_path / "grid.png")
+    with open(outPathName, "rb") as file:
+        assert file.read(8) == b"\x89PNG\r\n\x1a\n"
+    assert ii.render_thumbnails(cache, selections[2:], str(tmp_path / "none.png")) is None
@@ -0,0 +1,141 @@
+import pandas as pd
+import pytest
+from metadata_workflow import metaspace_fetch as mf
+
+class fakeDataset():
+    #the attributes of an SMDataset object that metaspaceFetch reads
+
+    def __init__(self, dataset_ID, info=None, metadata=None, adducts=None, ions=()):
+        self.name = "name " + dataset_ID
+        self.id = dataset_ID
+        self._info = info
+        self._metadata = metadata
+        self.adducts = adducts
+        self.database_details = [{"name": "HMDB", "version": "v4"}]
+        self.ions = list(ions)
+
+    def results(self, database=None, fdr=None):
+        if(not self.ions):
+            return pd.DataFrame()
+        return pd.DataFrame({"ion": self.ions, "fdr": [0.05] * len(self.ions)})
+
+class fakeInstance():
+
+    def __init__(self, host=None):
+        self.searches = list()
+
+    def datasets(self, idMask=None, **kwargs):
+        self.searches.append(list(idMask))
+        return [DATASETS[ID] for ID in idMask if ID in DATASETS]
+
+FULL_INFO = {"submitter": {"name": "A"}, "group": {"name": "G", "id": "g1", "shortName": "g"},
+             "metadataType": "Imaging MS", "ionisationSource": "MALDI",
+             "organism": "mouse", "organismPart": "brain", "condition": "wildtype",
+             "maldiMatrix": "DHB", "growthConditions": "none", "polarity": "POSITIVE",
+             "analyzer": {"type": "Orbitrap", "resolvingPower": "140000"}}
+
+FULL_METADATA = {"MS_Analysis": {"Analyzer": "Orbitrap",
+                                 "Pixel_Size": {"Xaxis": "20", "Yaxis": 50},
+                                 "Detector_Resolving_Power": {"mz": 200}},
+                 "Sample_Preparation": {"MALDI_Matrix_Application": "spray",
+                                        "Sample_Stabilisation": "frozen",
+                                        "Solvent": "water", "Tissue_Modification": ""},
+                 "Additional_Information": {"Supplementary": "x"}}
+
+DATASETS = {
+    "full": fakeDataset("full", FULL_INFO, FULL_METADATA, ["+H", "+Na"], ions=["C6H12O6+H"]),
+    "empty": fakeDataset("empty", None, {"MS_Analysis": None, "Sample_Preparation": "none"}),
+    "text": fakeDataset("text", {"analyzer": {"resolvingPower": "high"}, "polarity": "NEGATIVE"},
+                        {"MS_Analysis": {"Detector_Resolving_Power": {"mz": None},
+                                         "Pixel_Size": {"Xaxis": "n/a"}}},
+                        ions=["C24H45O7P-H"]),
+}
+
+@pytest.fixture
+def ms(monkeypatch):
+    monkeypatch.setattr(mf, "SMInstance", fakeInstance)
+    return mf.metaspaceFetch()
+
+def searches(ms):
+    return ms._metaspaceFetch__SM.searches
+
+def test_record_reads_nested_fields():
+    record = mf.datasetRecord(DATASETS["full"])
+
+    assert record.dataset is DATASETS["full"]
+    assert record.group["id"] == "g1"
+    assert record.analyzer == "Orbitrap"
+    assert record.adducts == ["+H", "+Na"]
+    assert record.resolving_power == 140000.0
+    assert record.mz_value == 200
+    assert record.pixel_axis("Xaxis") == 20.0 and record.pixel_axis("Yaxis") == 50
+    assert record.maldi_matrix_app == "spray"
+    #empty values are missing values
+    assert record.tissue_modification == "N/A"
+
+def test_record_missing_and_null_sections_are_na():
+    record = mf.datasetRecord(DATASETS["empty"], keep_Dataset=False)
+
+    assert record.dataset is None
+    assert record.adducts == []
+    for field in mf.datasetRecord.__slots__[3:]:
+        if(field != "adducts"):
+            assert getattr(record, field) == "N/A", field
+    assert record.pixel_axis("Xaxis") is None
+
+def test_number_keeps_text_it_cannot_parse():
+    assert mf._number("1.5") == 1.5 and mf._number(3) == 3
+    assert mf._number(None) == "N/A" and mf._number("") == "N/A"
+    assert mf._number("high") == "high"
+
+    record = mf.datasetRecord(DATASETS["text"])
+    assert record.resolving_power == "high"
+    assert record.mz_value == "N/A"
+    assert record.pixel_axis("Xaxis") is None
+
+def test_accessors_read_single_fields(ms):
+    dataset = DATASETS["full"]
+    record = ms.get_dataset_record(dataset)
+
+    for name, field in [("group", "group"), ("polarity", "polarity"),
+                        ("resolvingpower", "resolving_power"), ("mzvalue", "mz_value"),
+                        ("pixelsize", "pixel_size"), ("adducts", "adducts"),
+                        ("solvent", "solvent"), ("additionalinfo", "additional_info"),
+                        ("tissue_modification", "tissue_modification")]:
+        value = getattr(ms, "get_dataset_" + name)(dataset)
+        assert value == getattr(record, field), name
+        #records are read from directly
+        assert getattr(ms, "get_dataset_" + name)(record) == value
+    assert ms.get_dataset_organism(DATASETS["empty"]) == "N/A"
+
+def test_filter_metadata_skips_values_that_are_not_numbers(ms):
+    df = ms.make_dataframe(list(DATASETS.values()))
+
+    assert ms.filter_metadata(df, lessOrEq_ResolvingPower=[1000])["ID"].tolist() == ["full"]
+    assert ms.filter_metadata(df, lessOrEq_mzValue=[100])["ID"].tolist() == ["full"]
+    assert ms.filter_metadata(df, lessOrEq_PixelSize_Xaxis=[10])["ID"].tolist() == ["full"]
+    assert ms.filter_metadata(df, polarity=["negative"])["ID"].tolist() == ["text"]
+    assert ms.filter_metadata(df, groupID=["g1"])["ID"].tolist() == ["full"]
+
+def test_datasets_not_kept_are_loaded_in_one_search(ms):
+    df = ms.make_dataframe([DATASETS["full"], DATASETS["text"], fakeDataset("gone")],
+                           keep_Datasets=False)
+
+    assert df["SMDataset Object"].isna().all()
+    assert df["Resolving Power"].tolist() == [140000.0, "high", "N/A"]
+
+    df = ms.annotate(df)
+
+    assert searches(ms) == [["full", "text", "gone"]]
+    assert [len(molecules) for molecules in df["Molecules"]] == [1, 1, 0]
+
+def test_filter_molecule_uses_index_labels(ms):
+    df = ms.annotate(ms.make_dataframe(list(DATASETS.values())))
+    df.index = [10, 20, 30]
+
+    filtered = ms.filter_molecule(df, molecules=["C24H45O7P"])
+
+    assert filtered["ID"].tolist() == ["text"]
+    assert filtered["Molecules"].iloc[0][0]["ion"].tolist() == ["C24H45O7P-H"]
+    #datasets kept in the dataframe are not searched again
+    assert searches(ms) == []
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from metadata_workflow import replay_server as rs
+
+BIG_BODY = bytes(range(256)) * (rs.replayServer.BODY_LIMIT // 256 + 10)
+
+class upstreamHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if(self.path == "/big"):
+            self.send(200, "application/octet-stream", BIG_BODY)
+        elif(self.path == "/image"):
+            self.send(200, "image/png", b"image bytes")
+        else:
+            self.send(404, "application/json", b'{"error": "not found"}')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        link = "http://" + self.headers["Host"] + "/image"
+        self.send(200, "application/json",
+                  json.dumps({"query": json.loads(body), "link": link}).encode())
+
+    def send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), upstreamHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:" + str(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+def fetch(url, body=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body), timeout=10) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        with error:
+            return error.code, error.read()
+
+def test_record_then_replay_without_upstream(tmp_path, upstream):
+    cassettePathName = str(tmp_path / "cassette.sqlite")
+    with rs.replayServer(cassettePathName, mode="record", upstream=upstream) as server:
+        status, body = fetch(server.url + "/graphql", b'{"a": 1, "b": 2}')
+        link = json.loads(body)["link"]
+        #links in responses are sent back through the stand-in
+        assert link.startswith(server.url + rs.replayServer.REMOTE_PREFIX)
+        assert fetch(link) == (200, b"image bytes")
+        assert fetch(server.url + "/big") == (200, BIG_BODY)
+
+    #large bodies are kept out of the cassette
+    assert len(os.listdir(cassettePathName + ".bodies")) == 1
+
+    #another upstream, which is not running, is never asked
+    with rs.replayServer(cassettePathName, upstream="http://127.0.0.1:9") as server:
+        status, body = fetch(server.url + "/graphql", b'{"b": 2, "a": 1}')
+        assert status == 200 and json.loads(body)["query"] == {"a": 1, "b": 2}
+        assert fetch(json.loads(body)["link"]) == (200, b"image bytes")
+        assert fetch(server.url + "/big") == (200, BIG_BODY)
+        assert fetch(server.url + "/other")[0] == 404
+        stats = server.stats()
+
+    assert stats["requests"] == 4 and stats["errors"] == 1
+    assert stats["bytes"] > len(BIG_BODY)
+
+def test_record_answers_502_when_upstream_fails(tmp_path):
+    with rs.replayServer(str(tmp_path / "cassette.sqlite"), mode="record",
+                         upstream="http://127.0.0.1:9", upstream_Timeout=1) as server:
+        assert fetch(server.url + "/graphql", b"{}")[0] == 502
+    with rs.replayServer(str(tmp_path / "cassette.sqlite")) as server:
+        assert fetch(server.url + "/graphql", b"{}")[0] == 404
+
+def test_latency_and_bandwidth(tmp_path, upstream):
+    cassettePathName = str(tmp_path / "cassette.sqlite")
+    with rs.replayServer(cassettePathName, mode="record", upstream=upstream) as server:
+        fetch(server.url + "/big")
+        fetch(server.url + "/image")
+
+    with rs.replayServer(cassettePathName, latency_Seconds=0.1) as server:
+        for i in range(3):
+            assert fetch(server.url + "/image") == (200, b"image bytes")
+        assert server.stats()["p50"] >= 0.1
+
+    #about 0.25 seconds to send the big body
+    with rs.replayServer(cassettePathName, bandwidth_Bytes=len(BIG_BODY) * 4) as server:
+        start = time.perf_counter()
+        assert fetch(server.url + "/big") == (200, BIG_BODY)
+        assert time.perf_counter() - start >= 0.2
+        assert server.stats()["max"] >= 0.2
+
+def test_error_injection(tmp_path, upstream):
+    cassettePathName = str(tmp_path / "cassette.sqlite")
+    with rs.replayServer(cassettePathName, mode="record", upstream=upstream) as server:
+        fetch(server.url + "/image")
+
+    with rs.replayServer(cassettePathName, error_Rate=1.0) as server:
+        assert fetch(server.url + "/image")[0] == 503
+        assert server.stats()["errors"] == 1
+
+def test_seeded_injection_does_not_depend_on_arrival_order(tmp_path):
+    #nothing is recorded, requests that are not failed get a 404
+    requests = ["/path" + str(i % 20) for i in range(60)]
+
+    def run(order, threads):
+        with rs.replayServer(str(tmp_path / "cassette.sqlite"), error_Rate=0.5, seed=7) as server:
+            with ThreadPoolExecutor(threads) as pool:
+                statuses = list(pool.map(lambda path: fetch(server.url + path)[0], order))
+        outcomes = dict()
+        for path, status in zip(order, statuses):
+            outcomes.setdefault(path, list()).append(status)
+        #concurrent repeats of a path may swap places, the statuses they get may not
+        return {path: sorted(outcome) for path, outcome in outcomes.items()}
+
+    first = run(requests, 1)
+    assert first == run(requests[::-1], 8)
+    statuses = [status for outcome in first.values() for status in outcome]
+    assert 503 in statuses and 404 in statuses
@@ -0,0 +1,67 @@
+import os
+import time
+import tempfile
+import pandas as pd
+import pytest
+from metadata_workflow import work_queue as wq
+
+#workers are spawned by coordinate(), so these must be module level functions
+#and the test directory is passed to them through the environment
+
+def process_dataset(dataset_ID):
+    marker = os.path.join(os.environ["WORK_QUEUE_TEST_DIR"], "crashed")
+    #the first worker to claim "crash" dies without giving its lease back
+    if(dataset_ID == "crash" and not os.path.exists(marker)):
+        open(marker, "w").close()
+        os._exit(1)
+    if(dataset_ID == "bad"):
+        raise ValueError("bad dataset")
+    return pd.DataFrame([[dataset_ID, dataset_ID]], columns=["Name", "ID"])
+
+def slow_dataset(dataset_ID):
+    #leaves one file per run so the test can count how often a dataset ran
+    tempfile.mkstemp(prefix=dataset_ID + "-", dir=os.environ["WORK_QUEUE_TEST_DIR"])
+    time.sleep(1.5)
+    return pd.DataFrame([[dataset_ID, dataset_ID]], columns=["Name", "ID"])
+
+def unreachable_dataset(dataset_ID):
+    #SystemExit is not caught by run_worker(), it stops the worker process
+    raise SystemExit("METASPACE is unreachable")
+
+def test_coordinate_requeues_crashed_worker(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORK_QUEUE_TEST_DIR", str(tmp_path))
+    queuePathName = str(tmp_path / "queue.sqlite")
+    dataset_IDs = ["d0", "crash", "d1", "bad", "d2", "d3"]
+
+    df = wq.coordinate(dataset_IDs, queuePathName, str(tmp_path / "partitions"),
+                       workers=3, lease_Seconds=1.0, poll_Seconds=0.1,
+                       process_Dataset=process_dataset, max_Attempts=2)
+
+    assert os.path.exists(tmp_path / "crashed")
+    #the merged frame keeps the queue order and leaves out the failed dataset
+    assert df["ID"].tolist() == ["d0", "crash", "d1", "d2", "d3"]
+
+    queue = wq.leaseQueue(queuePathName)
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 5, "failed": 1}
+    assert list(queue.failed()) == ["bad"]
+    assert "bad dataset" in queue.failed()["bad"]
+
+def test_run_worker_renews_lease_of_slow_datasets(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORK_QUEUE_TEST_DIR", str(tmp_path))
+    dataset_IDs = ["a", "b"]
+
+    df = wq.coordinate(dataset_IDs, str(tmp_path / "queue.sqlite"), str(tmp_path / "partitions"),
+                       workers=3, lease_Seconds=0.5, poll_Seconds=0.1,
+                       process_Dataset=slow_dataset)
+
+    assert df["ID"].tolist() == dataset_IDs
+    #each dataset ran once even though it took longer than lease_Seconds
+    runs = sorted(name.split("-")[0] for name in os.listdir(tmp_path) if name[0] in "ab")
+    assert runs == dataset_IDs
+
+def test_coordinate_raises_when_workers_keep_crashing(tmp_path):
+    #every claim kills the worker, so no dataset is ever done or failed
+    with pytest.raises(RuntimeError, match="METASPACE is unreachable"):
+        wq.coordinate(["d0"], str(tmp_path / "queue.sqlite"), str(tmp_path / "partitions"),
+                      workers=1, lease_Seconds=0.5, poll_Seconds=0.1,
+                      process_Dataset=unreachable_dataset, max_Attempts=100, max_Restarts=2)